@@ -15,7 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .exceptions import GAEPyPIError
-from .templates import __templates__
+from .templates import PACKAGE_INDEX, VERSION_INDEX
 from .renderable import Renderable
 
 import six
@@ -42,15 +42,16 @@ class Package(BucketObject):
     Class representing a Python package (name, version and files)
     """
 
-    def __init__(self, storage, name, version):
+    def __init__(self, storage, name, version, files=None):
         super(Package, self).__init__(storage)
         self.name = name.lower()
         self.version = version
 
-        files = []
-        path = storage.get_package_path(name.lower(), version)
-        for f in storage.ls(path):
-            files.append(storage.split_path(f)['filename'])
+        if files is None:
+            files = []
+            path = storage.get_package_path(name.lower(), version)
+            for f in storage.ls(path):
+                files.append(storage.split_path(f)['filename'])
         self.files = set(files)
 
     def __str__(self):
@@ -73,8 +74,7 @@ class Package(BucketObject):
         return storage.path_exists(version_path)
 
     def to_html(self):
-        template = __templates__.get_template('package-index.html.j2')
-        return template.render({'indices': [[self]]})
+        return PACKAGE_INDEX.render({'indices': [[self]]})
 
     def empty(self):
         return len(self.files) == 0
@@ -87,13 +87,20 @@ class Package(BucketObject):
         gcs_file = storage.read(path)
         return gcs_file
 
-    def put_file(self, filename, content, storage=None):
+    def get_file_url(self, filename, storage=None):
+        if filename not in self.files:
+            raise GAEPyPIError("File not found for {0}".format(self))
+        storage = self.enquire_storage(storage)
+        path = storage.get_package_path(self.name, self.version, filename)
+        return storage.signed_url(path, filename)
+
+    def put_file(self, filename, content, storage=None, size=None):
         if filename in self.files:
             err_msg = "File {0} has already been added to {1}, upload a new version".format(filename, self)
             raise GAEPyPIError(err_msg)
         storage = self.enquire_storage(storage)
         path = storage.get_package_path(self.name, self.version, filename)
-        storage.write(path, content)
+        storage.write(path, content, size=size)
         self.files.add(filename)
 
 
@@ -105,18 +112,38 @@ class PackageIndex(BucketObject, set):
     @classmethod
     def get_all(cls, storage):
         """
-        Get all Package indices for a given storage
+        Get all Package indices for a given storage, built from a single recursive listing
         :return: iterable of PackageIndex
         """
-        path = storage.get_packages_path()
-        packages = storage.ls(path, dir_only=True)
-        return [cls(storage, storage.split_path(package_path)['package']) for package_path in packages]
-
-    def __init__(self, storage, name):
-        package_path = storage.get_package_path(name.lower())
-        contents = storage.ls(package_path, dir_only=True)
-        versions = [storage.split_path(version_path)['version'] for version_path in contents]
-        super(PackageIndex, self).__init__(storage, [Package(storage, name, v) for v in versions])
+        tree = cls._group_files(storage, storage.ls_recursive(storage.get_packages_path()))
+        return [cls(storage, name, versions) for name, versions in tree.items()]
+
+    @staticmethod
+    def _group_files(storage, file_paths):
+        """
+        Group file paths from a recursive listing by package and version
+        :return: dictionary of package -> (dictionary of version -> filenames)
+        """
+        tree = {}
+        for file_path in file_paths:
+            components = storage.split_path(file_path)
+            # skip folder placeholders, stray files and nested objects: only package/version/filename is served
+            if len(components) != 3 or '/' in components['filename']:
+                continue
+            versions = tree.setdefault(components['package'], {})
+            versions.setdefault(components['version'], []).append(components['filename'])
+        return tree
+
+    def __init__(self, storage, name, versions=None):
+        """
+        :param versions: optional dictionary of version -> filenames, listed from storage if omitted
+        """
+        if versions is None:
+            package_path = storage.get_package_path(name.lower())
+            tree = self._group_files(storage, storage.ls_recursive(package_path))
+            versions = tree.get(name.lower(), {})
+        packages = [Package(storage, name, v, files) for v, files in versions.items()]
+        super(PackageIndex, self).__init__(storage, packages)
         self.name = name
 
     def __str__(self):
@@ -153,11 +180,9 @@ class PackageIndex(BucketObject, set):
 
     def to_html(self, full_index=True):
         if full_index:
-            template = __templates__.get_template('package-index.html.j2')
-            return template.render({'indices': [self]})
+            return PACKAGE_INDEX.render({'indices': [self]})
         else:
-            template = __templates__.get_template('version-index.html.j2')
-            return template.render({'packages': self})
+            return VERSION_INDEX.render({'packages': self})
 
     def get_version(self, version):
         """
@@ -15,16 +15,61 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .package import PackageIndex
-from .templates import __templates__
+from .templates import PACKAGE_INDEX, STORAGE_INDEX
 from .renderable import Renderable
 
 import six
+import google.auth
 from abc import ABCMeta, abstractmethod
+from google.auth.credentials import Signing
+from google.auth.exceptions import RefreshError, TransportError
+from google.auth.transport.requests import Request
+from google.api_core.exceptions import GoogleAPIError
 from google.cloud import storage
-from io import BytesIO
-import os
-
-storage_client = storage.Client()
+from google.cloud.exceptions import NotFound
+from requests.adapters import HTTPAdapter
+from datetime import timedelta
+import logging
+import shutil
+
+HTTP_POOL_SIZE = 16
+SIGNED_URL_EXPIRATION = timedelta(minutes=5)
+# Covers storage, and the IAM signBlob call that signs urls with App Engine's default credentials.
+# App Engine honours requested scopes, a devstorage-only token is rejected by IAM.
+CREDENTIAL_SCOPES = ('https://www.googleapis.com/auth/cloud-platform',)
+PATH_COMPONENTS = ('package', 'version', 'filename')
+# Listings only use object names and prefixes; nextPageToken must stay in or pagination stops after one page.
+LISTING_FIELDS = 'items(name),prefixes,nextPageToken'
+NAME_ONLY_FIELDS = 'items(name),nextPageToken'
+
+
+def create_client(credentials, pool_size=HTTP_POOL_SIZE):
+	"""
+	Create a storage client whose HTTP session keeps up to pool_size connections to GCS alive,
+	so concurrent requests reuse connections instead of opening (and discarding) new ones.
+	"""
+	client = storage.Client(credentials=credentials)
+	client._http.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+	return client
+
+
+credentials, _ = google.auth.default(scopes=CREDENTIAL_SCOPES)
+storage_client = create_client(credentials)
+
+
+def signing_kwargs():
+	"""
+	Arguments for generate_signed_url. App Engine's default credentials hold no private key, in that case
+	the URL is signed through the IAM API on behalf of the service account.
+	:return: dictionary, or None if the credentials can not sign urls (e.g. user credentials)
+	"""
+	if isinstance(credentials, Signing):
+		return {}
+	if getattr(credentials, 'service_account_email', None) is None:
+		return None
+	if not credentials.valid:
+		credentials.refresh(Request())
+	return {'service_account_email': credentials.service_account_email, 'access_token': credentials.token}
 
 
 def to_bucket_and_path(p):
@@ -75,6 +120,15 @@ class Storage(Renderable):
         """
         pass
 
+    @abstractmethod
+    def ls_recursive(self, path):
+        """
+        list all files below a given path, at any depth.
+        :param path: scan this path
+        :return: iterable
+        """
+        pass
+
     @abstractmethod
     def read(self, path):
         """
@@ -85,9 +139,20 @@ class Storage(Renderable):
         pass
 
     @abstractmethod
-    def write(self, path, content):
+    def signed_url(self, path, filename):
+        """
+        Produce a short-lived url to download a specific file directly
+        :param path: path to file
+        :param filename: name to save the file as
+        :return: url, or None if the storage can not produce one (the file should be read instead)
+        """
+        pass
+
+    @abstractmethod
+    def write(self, path, content, size=None):
         """
         Write content to file
+        :param size: number of bytes to read from content, if known
         """
         pass
 
@@ -98,6 +163,13 @@ class Storage(Renderable):
         """
         pass
 
+    @abstractmethod
+    def path_exists(self, path):
+        """
+        Query if a folder exists, i.e. at least one object is stored below it (use file_exists for files)
+        """
+        pass
+
     def empty(self):
         """
         Verify if any packages are present in the storage
@@ -110,8 +182,7 @@ class Storage(Renderable):
         :param full_index: if true, print all files for all versions. if false, only print package names (once)
         """
         package_indices = PackageIndex.get_all(self)
-        template_file = 'storage-index.html.j2' if not full_index else 'package-index.html.j2'
-        template = __templates__.get_template(template_file)
+        template = PACKAGE_INDEX if full_index else STORAGE_INDEX
         return template.render({'indices': package_indices})
 
 
@@ -122,68 +193,102 @@ class GCStorage(Storage):
     def __init__(self, bucket, acl='project-private'):
         self.bucket = bucket
         self.acl = acl
+        self._bucket = storage_client.bucket(bucket)
+        self._bucket_prefix = '/{0}/'.format(bucket)
 
     def get_packages_path(self):
         return '/{0}/packages'.format(self.bucket)
 
+    def empty(self):
+        return not self.path_exists(self.get_packages_path())
+
     def get_package_path(self, package, version=None, filename=None):
-        path = os.path.join(self.get_packages_path(), package)
+        # GCS object names are always '/'-separated, whatever the local os.sep
+        path = '/{0}/packages/{1}'.format(self.bucket, package)
         if version:
-            path = os.path.join(path, version)
+            path += '/' + version
             if filename:
-                path = os.path.join(path, filename)
+                path += '/' + filename
         return path
 
     def split_path(self, path):
-        segments = path.split('/')
-        assert segments[1] == self.bucket
-        segments = segments[3:-1] if segments[-1] == '' else segments[3:]
-        components = ['package', 'version', 'filename']
-        return dict(zip(components, segments))
+        # '/<bucket>/packages/<package>/<version>/<filename>'
+        segments = path.rstrip('/').split('/', 5)[3:]
+        return dict(zip(PATH_COMPONENTS, segments))
 
     def ls(self, path, dir_only=False):
         padded = path if path[-1] == '/' else path + '/'
         _, bucket_path = to_bucket_and_path(padded)
-        blobs = storage_client.list_blobs(self.bucket, prefix=bucket_path, delimiter='/')
+        blobs = storage_client.list_blobs(self._bucket, prefix=bucket_path, delimiter='/',
+                                          fields=LISTING_FIELDS)
 
+        # prefixes are only populated while iterating, so the blobs are always walked
         ret = []
         for blob in blobs:
-            ret.append(self._legacy_path(blob.name))
+            if not dir_only:
+                ret.append(self._legacy_path(blob.name))
 
         if dir_only:
-            ret = []
-            for p in blobs.prefixes:
-                ret.append(self._legacy_path(p))
+            ret = [self._legacy_path(p) for p in blobs.prefixes]
         return ret
 
+    def ls_recursive(self, path):
+        padded = path if path[-1] == '/' else path + '/'
+        _, bucket_path = to_bucket_and_path(padded)
+        blobs = storage_client.list_blobs(self._bucket, prefix=bucket_path, fields=NAME_ONLY_FIELDS)
+        return [self._legacy_path(blob.name) for blob in blobs]
+
     def _legacy_path(self, p):
-        return '/' + self.bucket + '/' + p
+        return self._bucket_prefix + p
+
+    def _stat(self, path):
+        """
+        Fetch the metadata of a file in a single request
+        :return: Blob, or None if the file does not exist
+        """
+        _, bucket_path = to_bucket_and_path(path)
+        return self._bucket.get_blob(bucket_path)
 
     def read(self, path):
+        blob = self._stat(path)
+        if blob is None:
+            raise NotFound('{0} does not exist'.format(path))
+        return blob.open('rb')
+
+    def signed_url(self, path, filename):
         _, bucket_path = to_bucket_and_path(path)
-        bucket = storage_client.bucket(self.bucket)
-        blob = bucket.blob(bucket_path)
-        file_obj = BytesIO()
-        blob.download_to_file(file_obj)
-        file_obj.seek(0)
-        return file_obj
-
-    def write(self, path, content):
+        blob = self._bucket.blob(bucket_path)
+        disposition = 'attachment; filename="{0}"'.format(filename)
+        try:
+            kwargs = signing_kwargs()
+            if kwargs is None:
+                return None
+            return blob.generate_signed_url(version='v4', expiration=SIGNED_URL_EXPIRATION, method='GET',
+                                            response_disposition=disposition, **kwargs)
+        except (RefreshError, TransportError, GoogleAPIError):
+            # e.g. the service account may not sign on its own behalf (see README), the file is read instead
+            logging.exception('Signing a download url for %s failed', path)
+            return None
+
+    def write(self, path, content, size=None):
         _, bucket_path = to_bucket_and_path(path)
-        bucket = storage_client.bucket(self.bucket)
-        blob = bucket.blob(bucket_path)
-        blob.upload_from_file(file_obj=content)
+        blob = self._bucket.blob(bucket_path)
+        if getattr(content, 'seekable', lambda: False)():
+            blob.upload_from_file(file_obj=content, size=size)
+        else:
+            # raw request bodies (e.g. gunicorn's) can't tell(), which resumable uploads above 8 MiB rely on
+            with blob.open('wb') as f:
+                shutil.copyfileobj(content, f)
 
     def file_exists(self, path):
         _, bucket_path = to_bucket_and_path(path)
-        bucket = storage_client.bucket(self.bucket)
-        blob = bucket.blob(bucket_path)
+        blob = self._bucket.blob(bucket_path)
         return blob.exists()
 
     def path_exists(self, path):
-        _, bucket_path = to_bucket_and_path(path)
-        blobs = storage_client.list_blobs(self.bucket, prefix=bucket_path, delimiter='/')
-        ret = {}
-        for blob in blobs:
-            ret.add(blob.name)
-        return bucket_path in ret or len(blobs.prefixes)
+        # a folder exists as soon as a single object is stored below it
+        padded = path if path[-1] == '/' else path + '/'
+        _, bucket_path = to_bucket_and_path(padded)
+        blobs = storage_client.list_blobs(self._bucket, prefix=bucket_path, max_results=1,
+                                          fields=NAME_ONLY_FIELDS)
+        return next(iter(blobs), None) is not None
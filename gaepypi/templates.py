@@ -18,4 +18,9 @@ import os
 import jinja2
 
 __templates__ = jinja2.Environment(loader=jinja2.FileSystemLoader(
-    os.path.join(os.path.dirname(__file__), 'templates')))
\ No newline at end of file
+    os.path.join(os.path.dirname(__file__), 'templates')), auto_reload=False, cache_size=-1)
+
+# Compiled once at import, rendering then skips the environment lookup
+STORAGE_INDEX = __templates__.get_template('storage-index.html.j2')
+PACKAGE_INDEX = __templates__.get_template('package-index.html.j2')
+VERSION_INDEX = __templates__.get_template('version-index.html.j2')
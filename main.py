@@ -1,6 +1,8 @@
+import functools
+import io
 import os
 
-from flask import Flask, request, abort, send_file
+from flask import Flask, Response, request, abort, redirect
 from google.cloud.exceptions import NotFound
 
 from gaepypi import Package, GCStorage, GAEPyPIError, PackageIndex
@@ -9,15 +11,36 @@ from google.appengine.api import app_identity, wrap_wsgi_app
 
 app = Flask(__name__)
 app.wsgi_app = wrap_wsgi_app(app.wsgi_app)
-storage = None
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
 
 
+@functools.lru_cache(maxsize=1)
 def get_storage():
-	global storage
-	if not storage:
-		bucket_name = os.environ.get('BUCKET_NAME') or app_identity.get_default_gcs_bucket_name()
-		storage = GCStorage(bucket_name)
-	return storage
+	bucket_name = os.environ.get('BUCKET_NAME') or app_identity.get_default_gcs_bucket_name()
+	return GCStorage(bucket_name)
+
+
+def file_size(file_obj):
+	# GCS readers know the blob size from its metadata, seeking does not download anything
+	size = file_obj.seek(0, io.SEEK_END)
+	file_obj.seek(0)
+	return size
+
+
+def stream_file(file_obj, chunk_size=DOWNLOAD_CHUNK_SIZE):
+	with file_obj:
+		for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+			yield chunk
+
+
+def head_package(package):
+	"""
+	Answer existence probes on a package without listing its versions or rendering the index
+	"""
+	st = get_storage()
+	if st.path_exists(st.get_package_path(package)):
+		return ''
+	abort(404)
 
 
 @app.route("/")
@@ -60,10 +83,12 @@ def packages_get():
 		return st.to_html(full_index=False)
 
 
-@app.route("/packages/<package>", methods=['GET'])
-@app.route("/packages/<package>/", methods=['GET'])
+@app.route("/packages/<package>", methods=['GET', 'HEAD'])
+@app.route("/packages/<package>/", methods=['GET', 'HEAD'])
 @basic_auth()
 def packages_get_package(package):
+	if request.method == 'HEAD':
+		return head_package(package)
 	index = PackageIndex(get_storage(), package)
 	if index.exists():
 		return index.to_html(full_index=False)
@@ -85,18 +110,37 @@ def get(package, version):
 def package_download(name, version, filename):
 	try:
 		package = Package(get_storage(), name, version)
+		url = package.get_file_url(filename)
+		if url:
+			return redirect(url, code=302)
+		# credentials that can not sign urls (e.g. a local development server): serve the file ourselves
 		gcs_file = package.get_file(filename)
-		return send_file(gcs_file, mimetype='application/octet-stream', as_attachment=True, download_name=filename)
+		headers = {'Content-Disposition': 'attachment; filename="{0}"'.format(filename)}
+		headers['Content-Length'] = str(file_size(gcs_file))
+		return Response(stream_file(gcs_file), mimetype='application/octet-stream', headers=headers)
 	except (NotFound, GAEPyPIError):
 		abort(404)
 
 
-@app.route("/pypi/<path:package>", methods=['GET'])
+@app.route("/packages/<name>/<version>/<filename>", methods=['PUT'])
+@basic_auth(required_roles=['write'])
+def package_upload(name, version, filename):
+	try:
+		package = Package(get_storage(), name, version)
+		package.put_file(filename, request.stream, size=request.content_length)
+	except GAEPyPIError as e:
+		abort(403)
+	return "", 201
+
+
+@app.route("/pypi/<path:package>", methods=['GET', 'HEAD'])
 @basic_auth()
 def pypi_package_get(package):
-	st = get_storage()
-	index = PackageIndex(st, package)
-	if not index.empty() and index.exists(st):
+	if request.method == 'HEAD':
+		return head_package(package)
+	index = PackageIndex(get_storage(), package)
+	# the index is built from the objects stored below the package, so a non-empty index exists
+	if not index.empty():
 		return index.to_html(full_index=True)
 	abort(404)
 
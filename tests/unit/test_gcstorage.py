@@ -1,6 +1,12 @@
 from google.appengine.ext import testbed
+from google.cloud.exceptions import NotFound
+from google.auth.credentials import Signing
+from google.auth.exceptions import RefreshError, TransportError
 from gaepypi import GCStorage
-from mock import patch, Mock, PropertyMock
+from gaepypi.storage import signing_kwargs
+from mock import patch, Mock, MagicMock, PropertyMock
+from datetime import timedelta
+from io import BytesIO
 import unittest
 
 
@@ -33,6 +39,176 @@ class TestGCSStorage(unittest.TestCase):
         assert self.s.split_path('/mybucket/packages/dummy/0.0.1/file.txt') == {'package': 'dummy',
                                                                                 'version': '0.0.1',
                                                                                 'filename': 'file.txt'}
+
+    def test_bucket(self):
+        assert self.s._bucket.name == 'mybucket'
+
+    def test_read(self):
+        blob = Mock()
+        with patch.object(self.s, '_bucket') as bucket:
+            bucket.get_blob.return_value = blob
+            assert self.s.read('/mybucket/path/a.txt') == blob.open.return_value
+            bucket.get_blob.assert_called_with('path/a.txt')
+        blob.open.assert_called_with('rb')
+
+    def test_read_not_found(self):
+        with patch.object(self.s, '_bucket') as bucket:
+            bucket.get_blob.return_value = None
+            with self.assertRaises(NotFound):
+                self.s.read('/mybucket/path/a.txt')
+
+    @patch('gaepypi.storage.signing_kwargs', return_value={})
+    def test_signed_url(self, signing):
+        with patch.object(self.s, '_bucket') as bucket:
+            blob = bucket.blob.return_value
+            blob.generate_signed_url.return_value = 'https://storage.googleapis.com/signed'
+            assert self.s.signed_url('/mybucket/path/a.txt', 'a.txt') == 'https://storage.googleapis.com/signed'
+            bucket.blob.assert_called_with('path/a.txt')
+            blob.generate_signed_url.assert_called_with(version='v4', expiration=timedelta(minutes=5), method='GET',
+                                                        response_disposition='attachment; filename="a.txt"')
+
+    @patch('gaepypi.storage.signing_kwargs', return_value=None)
+    def test_signed_url_unsupported(self, signing):
+        with patch.object(self.s, '_bucket') as bucket:
+            assert self.s.signed_url('/mybucket/path/a.txt', 'a.txt') is None
+            bucket.blob.return_value.generate_signed_url.assert_not_called()
+
+    @patch('gaepypi.storage.signing_kwargs', return_value={'service_account_email': 'app@appspot.gserviceaccount.com',
+                                                            'access_token': 'token'})
+    def test_signed_url_signing_fails(self, signing):
+        with patch.object(self.s, '_bucket') as bucket:
+            bucket.blob.return_value.generate_signed_url.side_effect = TransportError('403 Forbidden')
+            assert self.s.signed_url('/mybucket/path/a.txt', 'a.txt') is None
+
+    @patch('google.cloud.storage._signing.requests.Request')
+    def test_signed_url_iam_rejected(self, transport):
+        # real signing through the IAM API, which rejects the token (e.g. insufficient scopes)
+        transport.return_value.return_value = Mock(status=403, data=b'ACCESS_TOKEN_SCOPE_INSUFFICIENT')
+        credentials = Mock(service_account_email='app@appspot.gserviceaccount.com', token='token', valid=True)
+        with patch('gaepypi.storage.credentials', credentials):
+            assert self.s.signed_url('/mybucket/path/a.txt', 'a.txt') is None
+        transport.return_value.assert_called_once()
+
+    @patch('gaepypi.storage.signing_kwargs', side_effect=RefreshError('invalid_scope'))
+    def test_signed_url_refresh_fails(self, signing):
+        with patch.object(self.s, '_bucket') as bucket:
+            assert self.s.signed_url('/mybucket/path/a.txt', 'a.txt') is None
+            bucket.blob.return_value.generate_signed_url.assert_not_called()
+
+    def test_signing_kwargs_private_key(self):
+        with patch('gaepypi.storage.credentials', Mock(spec=Signing)):
+            assert signing_kwargs() == {}
+
+    def test_signing_kwargs_service_account(self):
+        credentials = Mock(service_account_email='app@appspot.gserviceaccount.com', token='token', valid=False)
+        with patch('gaepypi.storage.credentials', credentials):
+            assert signing_kwargs() == {'service_account_email': 'app@appspot.gserviceaccount.com',
+                                        'access_token': 'token'}
+        credentials.refresh.assert_called_once()
+
+    def test_signing_kwargs_user_credentials(self):
+        with patch('gaepypi.storage.credentials', Mock(spec=['token', 'valid', 'refresh'])):
+            assert signing_kwargs() is None
+
+    def test_write(self):
+        content = BytesIO(b'content')
+        with patch.object(self.s, '_bucket') as bucket:
+            self.s.write('/mybucket/path/a.txt', content, size=7)
+            bucket.blob.assert_called_with('path/a.txt')
+            bucket.blob.return_value.upload_from_file.assert_called_with(file_obj=content, size=7)
+            bucket.blob.return_value.open.assert_not_called()
+
+    def test_write_stream(self):
+        class Stream(object):
+            # like a raw WSGI input: read() only, no seek() or tell()
+            def __init__(self, data):
+                self._data = BytesIO(data)
+
+            def read(self, size=-1):
+                return self._data.read(size)
+
+        data = b'x' * (9 * 1024 * 1024)
+        written = []
+        with patch.object(self.s, '_bucket') as bucket:
+            blob = bucket.blob.return_value
+            blob.open.return_value.__enter__.return_value.write.side_effect = written.append
+            self.s.write('/mybucket/path/a.whl', Stream(data), size=len(data))
+            blob.open.assert_called_with('wb')
+            blob.upload_from_file.assert_not_called()
+        assert b''.join(written) == data
+
+    def test_file_exists(self):
+        with patch.object(self.s, '_bucket') as bucket:
+            bucket.blob.return_value.exists.return_value = True
+            assert self.s.file_exists('/mybucket/path/a.txt')
+            bucket.blob.assert_called_once_with('path/a.txt')
+            bucket.get_blob.assert_not_called()
+
+    def test_file_not_exists(self):
+        with patch.object(self.s, '_bucket') as bucket:
+            bucket.blob.return_value.exists.return_value = False
+            assert not self.s.file_exists('/mybucket/path/a.txt')
+            bucket.blob.assert_called_once_with('path/a.txt')
+
+    def _blobs_mock(self, names, prefixes):
+        blobs = []
+        for name in names:
+            m = Mock()
+            type(m).name = PropertyMock(return_value=name)
+            blobs.append(m)
+        iterator = MagicMock()
+        iterator.__iter__.return_value = iter(blobs)
+        iterator.prefixes = set(prefixes)
+        return iterator
+
+    @patch('gaepypi.storage.storage_client')
+    def test_ls_all(self, client):
+        client.list_blobs.return_value = self._blobs_mock(['path/a.txt', 'path/b.txt'], ['path/dummy/'])
+        retrieved = self.s.ls('/mybucket/path')
+        client.list_blobs.assert_called_with(self.s._bucket, prefix='path/', delimiter='/',
+                                             fields='items(name),prefixes,nextPageToken')
+        assert retrieved == ['/mybucket/path/a.txt', '/mybucket/path/b.txt']
+
+    @patch('gaepypi.storage.storage_client')
+    def test_ls_dir_only(self, client):
+        client.list_blobs.return_value = self._blobs_mock(['path/a.txt'], ['path/dummy/'])
+        retrieved = self.s.ls('/mybucket/path/', dir_only=True)
+        client.list_blobs.assert_called_with(self.s._bucket, prefix='path/', delimiter='/',
+                                             fields='items(name),prefixes,nextPageToken')
+        assert retrieved == ['/mybucket/path/dummy/']
+
+    @patch('gaepypi.storage.storage_client')
+    def test_path_exists(self, client):
+        client.list_blobs.return_value = self._blobs_mock(['path/dummy/0.0.1/a.whl'], [])
+        assert self.s.path_exists('/mybucket/path/dummy')
+        client.list_blobs.assert_called_with(self.s._bucket, prefix='path/dummy/', max_results=1,
+                                             fields='items(name),nextPageToken')
+
+    @patch('gaepypi.storage.storage_client')
+    def test_path_not_exists(self, client):
+        client.list_blobs.return_value = self._blobs_mock([], [])
+        assert not self.s.path_exists('/mybucket/path/dummy/')
+        client.list_blobs.assert_called_with(self.s._bucket, prefix='path/dummy/', max_results=1,
+                                             fields='items(name),nextPageToken')
+
+    @patch('gaepypi.storage.storage_client')
+    def test_empty(self, client):
+        client.list_blobs.return_value = self._blobs_mock([], [])
+        assert self.s.empty()
+        client.list_blobs.assert_called_once_with(self.s._bucket, prefix='packages/', max_results=1,
+                                                  fields='items(name),nextPageToken')
+
+    @patch('gaepypi.storage.storage_client')
+    def test_not_empty(self, client):
+        client.list_blobs.return_value = self._blobs_mock(['packages/dummy/0.0.1/a.whl'], [])
+        assert not self.s.empty()
+
+    @patch('gaepypi.storage.storage_client')
+    def test_ls_recursive(self, client):
+        client.list_blobs.return_value = self._blobs_mock(['path/dummy/0.0.1/a.whl', 'path/dummy/0.0.2/b.whl'], [])
+        retrieved = self.s.ls_recursive('/mybucket/path')
+        client.list_blobs.assert_called_with(self.s._bucket, prefix='path/', fields='items(name),nextPageToken')
+        assert retrieved == ['/mybucket/path/dummy/0.0.1/a.whl', '/mybucket/path/dummy/0.0.2/b.whl']
     #
     # @patch('gaepypi.storage.gcs.listbucket')
     # def test_file_exists(self, mock):
@@ -3,18 +3,6 @@ import mock
 import unittest
 
 
-class ResponseList(object):
-    def __init__(self, *args):
-        super(ResponseList, self).__init__()
-        self.responses = args
-        self._counter = 0
-
-    def __call__(self, *args, **kwargs):
-        val = self.responses[self._counter % len(self.responses)]
-        self._counter += 1
-        return val
-
-
 class TestPackageIndex(unittest.TestCase):
 
     def _storage_mock(self, name, version, files):
@@ -28,36 +16,34 @@ class TestPackageIndex(unittest.TestCase):
 
     def setUp(self):
         # Prepare storage interactions
-        self.storage = mock.Mock()
-        path = '/mybucket/packages/dummy'
-        self.storage.get_package_path = mock.Mock(side_effect=ResponseList(path, path + '/0.0.1', path + '/0.0.2'))
-        self.storage.ls = mock.Mock(
-            side_effect=ResponseList(['/mybucket/packages/dummy/0.0.1', '/mybucket/packages/dummy/0.0.2'],
-                                     ['/mybucket/packages/dummy/0.0.1/a.whl'],
-                                     ['/mybucket/packages/dummy/0.0.2/b.whl']))
-        self.storage.split_path = mock.Mock(side_effect=ResponseList(dict(version='0.0.1'),
-                                                                dict(version='0.0.2'),
-                                                                dict(filename='a.whl'),
-                                                                dict(filename='b.whl')))
+        self.storage = self._recursive_storage_mock(['/mybucket/packages/dummy/0.0.1/a.whl',
+                                                     '/mybucket/packages/dummy/0.0.2/b.whl'])
+        self.storage.get_package_path = mock.Mock(return_value='/mybucket/packages/dummy')
 
         self.index = PackageIndex(self.storage, 'dummy')
 
     def test_instantiation(self):
-        # Verify calls
-        self.storage.get_package_path.assert_has_calls([mock.call('dummy'),
-                                                   mock.call('dummy', '0.0.1'),
-                                                   mock.call('dummy', '0.0.2')])
-        self.storage.ls.assert_has_calls([mock.call('/mybucket/packages/dummy', dir_only=True),
-                                     mock.call('/mybucket/packages/dummy/0.0.1/'),
-                                     mock.call('/mybucket/packages/dummy/0.0.2/')])
-        self.storage.split_path.assert_has_calls([mock.call('/mybucket/packages/dummy/0.0.1'),
-                                             mock.call('/mybucket/packages/dummy/0.0.2'),
-                                             mock.call('/mybucket/packages/dummy/0.0.1/a.whl'),
-                                             mock.call('/mybucket/packages/dummy/0.0.2/b.whl')])
+        # Verify calls: a single recursive listing, no listing per version
+        self.storage.get_package_path.assert_called_once_with('dummy')
+        self.storage.ls_recursive.assert_called_once_with('/mybucket/packages/dummy')
+        self.storage.ls.assert_not_called()
+        self.storage.split_path.assert_has_calls([mock.call('/mybucket/packages/dummy/0.0.1/a.whl'),
+                                                  mock.call('/mybucket/packages/dummy/0.0.2/b.whl')])
         assert self.index.name == 'dummy'
         assert self.index.size == len(self.index) == 2
         assert not self.index.empty()
 
+    def test_instantiation_capitals(self):
+        index = PackageIndex(self.storage, 'Dummy')
+        self.storage.get_package_path.assert_called_with('dummy')
+        assert index.size == 2
+
+    def test_instantiation_not_found(self):
+        storage = self._recursive_storage_mock([])
+        storage.get_package_path = mock.Mock(return_value='/mybucket/packages/wheel')
+        index = PackageIndex(storage, 'wheel')
+        assert index.empty()
+
     def test_content(self):
         s1 = self._storage_mock('dummy', '0.0.1', ['a.whl'])
         s2 = self._storage_mock('dummy', '0.0.2', ['b.whl'])
@@ -112,3 +98,50 @@ class TestPackageIndex(unittest.TestCase):
         assert not self.index.exists()
         self.storage.path_exists.assert_called_with('/mybucket/packages/dummy')
 
+    def _recursive_storage_mock(self, paths):
+        storage = mock.Mock()
+        storage.get_packages_path = mock.Mock(return_value='/mybucket/packages')
+        storage.ls_recursive = mock.Mock(return_value=paths)
+        storage.split_path = mock.Mock(
+            side_effect=lambda p: dict(zip(['package', 'version', 'filename'], p.rstrip('/').split('/', 5)[3:])))
+        return storage
+
+    def test_get_all(self):
+        storage = self._recursive_storage_mock(['/mybucket/packages/dummy/0.0.1/a.whl',
+                                                '/mybucket/packages/dummy/0.0.2/b.whl',
+                                                '/mybucket/packages/dummy/0.0.2/b.tar.gz',
+                                                '/mybucket/packages/wheel/0.1/c.whl'])
+
+        indices = sorted(PackageIndex.get_all(storage))
+
+        storage.ls_recursive.assert_called_once_with('/mybucket/packages')
+        storage.ls.assert_not_called()
+        assert [index.name for index in indices] == ['dummy', 'wheel']
+        assert indices[0].size == 2
+        assert indices[0].get_version('0.0.1').files == set(['a.whl'])
+        assert indices[0].get_version('0.0.2').files == set(['b.whl', 'b.tar.gz'])
+        assert indices[1].get_version('0.1').files == set(['c.whl'])
+
+    def test_get_all_folder_placeholders(self):
+        storage = self._recursive_storage_mock(['/mybucket/packages/',
+                                                '/mybucket/packages/dummy/',
+                                                '/mybucket/packages/dummy/0.0.1/',
+                                                '/mybucket/packages/dummy/0.0.1/a.whl'])
+
+        indices = PackageIndex.get_all(storage)
+
+        assert [index.name for index in indices] == ['dummy']
+        assert indices[0].size == 1
+        assert indices[0].get_version('0.0.1').files == set(['a.whl'])
+
+    def test_get_all_stray_and_nested_objects(self):
+        storage = self._recursive_storage_mock(['/mybucket/packages/README',
+                                                '/mybucket/packages/dummy/notes.txt',
+                                                '/mybucket/packages/dummy/0.0.1/sub/a.whl',
+                                                '/mybucket/packages/dummy/0.0.1/b.whl'])
+
+        indices = PackageIndex.get_all(storage)
+
+        assert [index.name for index in indices] == ['dummy']
+        assert indices[0].size == 1
+        assert indices[0].get_version('0.0.1').files == set(['b.whl'])
@@ -0,0 +1,65 @@
+from io import BytesIO
+from main import app
+from gaepypi import GAEPyPIError
+import base64
+import mock
+import unittest
+
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.headers = {'Authorization': 'Basic ' + base64.b64encode(b'user:password').decode()}
+        patchers = [mock.patch('main.get_storage'),
+                    mock.patch('gaepypi._decorators.valid_credentials', return_value=True)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @mock.patch('main.Package')
+    def test_download_redirect(self, package):
+        package.return_value.get_file_url.return_value = 'https://storage.googleapis.com/signed'
+        response = self.client.get('/packages/dummy/0.0.1/a.whl', headers=self.headers)
+        assert response.status_code == 302
+        assert response.headers['Location'] == 'https://storage.googleapis.com/signed'
+        package.return_value.get_file.assert_not_called()
+
+    @mock.patch('main.Package')
+    def test_download_stream(self, package):
+        package.return_value.get_file_url.return_value = None
+        package.return_value.get_file.return_value = BytesIO(b'x' * 1000)
+        response = self.client.get('/packages/dummy/0.0.1/a.whl', headers=self.headers)
+        assert response.status_code == 200
+        assert response.data == b'x' * 1000
+        assert response.headers['Content-Length'] == '1000'
+        assert response.headers['Content-Disposition'] == 'attachment; filename="a.whl"'
+        package.return_value.get_file_url.assert_called_with('a.whl')
+
+    @mock.patch('main.Package')
+    def test_upload(self, package):
+        response = self.client.put('/packages/dummy/0.0.1/a.whl', data=b'x' * 1000, headers=self.headers)
+        assert response.status_code == 201
+        package.assert_called_with(mock.ANY, 'dummy', '0.0.1')
+        package.return_value.put_file.assert_called_with('a.whl', mock.ANY, size=1000)
+
+    @mock.patch('main.Package')
+    def test_upload_exists(self, package):
+        package.return_value.put_file.side_effect = GAEPyPIError('exists')
+        response = self.client.put('/packages/dummy/0.0.1/a.whl', data=b'x', headers=self.headers)
+        assert response.status_code == 403
+
+    @mock.patch('main.PackageIndex')
+    def test_pypi_package(self, index):
+        index.return_value.empty.return_value = False
+        index.return_value.to_html.return_value = 'index'
+        response = self.client.get('/pypi/dummy', headers=self.headers)
+        assert response.status_code == 200
+        index.return_value.to_html.assert_called_with(full_index=True)
+        index.return_value.exists.assert_not_called()
+
+    @mock.patch('main.PackageIndex')
+    def test_pypi_package_not_found(self, index):
+        index.return_value.empty.return_value = True
+        response = self.client.get('/pypi/dummy', headers=self.headers)
+        assert response.status_code == 404
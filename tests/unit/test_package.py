@@ -117,6 +117,22 @@ class TestPackage(unittest.TestCase):
         storage.read.assert_called_with('/mybucket/packages/dummy/0.0.1/a.txt')
         storage.get_package_path.assert_called_with('dummy', '0.0.1', 'a.txt')
 
+    def test_getfile_url_not_found(self):
+        storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
+        p = Package(storage, 'dummy', '0.0.1')
+        with self.assertRaises(GAEPyPIError):
+            p.get_file_url('b.txt')
+
+    def test_getfile_url(self):
+        storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
+        p = Package(storage, 'dummy', '0.0.1')
+        storage.get_package_path = mock.Mock(return_value='/mybucket/packages/dummy/0.0.1/a.txt')
+        storage.signed_url = mock.Mock(return_value='https://storage.googleapis.com/signed')
+
+        assert p.get_file_url('a.txt') == 'https://storage.googleapis.com/signed'
+        storage.signed_url.assert_called_with('/mybucket/packages/dummy/0.0.1/a.txt', 'a.txt')
+        storage.get_package_path.assert_called_with('dummy', '0.0.1', 'a.txt')
+
     def test_putfile_exists(self):
         storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
         p = Package(storage, 'dummy', '0.0.1')
@@ -133,4 +149,14 @@ class TestPackage(unittest.TestCase):
 
         assert 'b.txt' in p.files
         storage.get_package_path.assert_called_with('dummy', '0.0.1', 'b.txt')
-        storage.write.assert_called_with('/mybucket/packages/dummy/0.0.1/b.txt', 'content')
\ No newline at end of file
+        storage.write.assert_called_with('/mybucket/packages/dummy/0.0.1/b.txt', 'content', size=None)
+
+    def test_putfile_size(self):
+        storage = self._storage_mock('dummy', '0.0.1', ['a.txt'])
+        p = Package(storage, 'dummy', '0.0.1')
+        storage.write = mock.Mock()
+        storage.get_package_path = mock.Mock(return_value='/mybucket/packages/dummy/0.0.1/b.txt')
+        p.put_file('b.txt', 'content', size=7)
+
+        assert 'b.txt' in p.files
+        storage.write.assert_called_with('/mybucket/packages/dummy/0.0.1/b.txt', 'content', size=7)
\ No newline at end of file